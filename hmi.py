@@ -1,5 +1,6 @@
 import curses
 import logging
+import time
 
 import shared_cfg
 import hardware
@@ -9,6 +10,16 @@ CW_ORDER = [1, 3, 0, 2]
 CCW_ORDER = [2, 0, 3, 1]
 TICKS_PER_STEP = float(2)
 
+# Main loop is paced to this many passes per second while idle, so that
+# polling the hardware does not keep a CPU core busy.
+FRAMES_PER_SECOND = 30
+# The encoder is decoded by polling, and a step is only counted if each
+# quadrature state is seen. For this long after the last encoder change the
+# loop polls every ENCODER_POLL_INTERVAL seconds instead of pacing to
+# FRAMES_PER_SECOND, so fast turns do not skip states.
+ENCODER_ACTIVE_SECONDS = 1.0
+ENCODER_POLL_INTERVAL = 0.001
+
 
 # Button label positions are determined empirically and are dependent on
 # character resolution.
@@ -36,6 +47,11 @@ HW_BTN_LABEL = {
 }
 
 
+# Buttons whose labels are shown only in keyboard mode, in drawing order
+KEYBOARD_MODE_BUTTONS = [ButtonAction.EDIT, ButtonAction.BUTTON_3,
+                         ButtonAction.BACK]
+
+
 # Color pair IDs
 class ColorPair:
     NORMAL = 1
@@ -77,6 +93,11 @@ class StoreNavigator:
         self.row_extent = Extent(min_row+1, max_row) # Eat one row for parent
         self.level_container_names = []
         self.level_entry_names = []
+        self.entry_action_texts = [] # Action results for the current Entry
+        # Selection and top row as of the last render; None forces a full
+        # repaint.
+        self.rendered_selection = None
+        self.rendered_top_row_index = None
         log.debug("New navigator: min_row: {0}  max_row: {1}  vis_rows: {2}\n"
                   "min_col: {3}  max_col: {4}  vis_cols: {5}"
                   .format(min_row, max_row, self.row_extent.span(),
@@ -142,18 +163,21 @@ class StoreNavigator:
 
         self.level_container_names = []
         self.level_entry_names = []
-        if not self.entry:
+        self.entry_action_texts = []
+        if self.entry:
+            # Resolve the entry once rather than on every render
+            _, entry = shared_cfg.master_store.get_entry_by_path(self.level)
+            for _, action in self.entry_actions:
+                self.entry_action_texts.append(getattr(entry, action)())
+        else:
             self.level_container = shared_cfg.master_store.get_container_by_path(self.level)
-            for k, c in self.level_container.get_containers():
-                self.level_container_names.append(k)
-            for k, e in self.level_container.get_entries():
-                self.level_entry_names.append(k)
-            self.level_container_names.sort()
-            self.level_entry_names.sort()
+            self.level_container_names = self.level_container.get_sorted_container_names()
+            self.level_entry_names = self.level_container.get_sorted_entry_names()
 
         if not went_back:
             self.selection = 0
             self.top_row_index = 0
+        self.rendered_selection = None
 
     def get_selection(self):
         """
@@ -206,71 +230,117 @@ class StoreNavigator:
         return path
 
     def render_level(self, stdscr):
-        stdscr.addstr(self.parent_info_row,
-                      self.col_extent.min,
-                      self.elide_path_string(self.level).center(self.col_extent.span()),
-                      curses.A_BOLD)
-        if not self.entry:
-            self.render_container(stdscr)
+        """
+        Renders the current level. If the view has not scrolled since it was
+        last rendered, only the rows of the old and new selection are redrawn.
+        """
+        if self.entry:
+            render_row = self.render_entry_row
         else:
-            self.render_entry(stdscr)
+            render_row = self.render_container_row
+
+        if (self.rendered_selection is not None and
+                self.rendered_top_row_index == self.top_row_index):
+            if self.rendered_selection != self.selection:
+                render_row(stdscr, self.rendered_selection)
+                render_row(stdscr, self.selection)
+        else:
+            stdscr.addstr(self.parent_info_row,
+                          self.col_extent.min,
+                          self.elide_path_string(self.level).center(self.col_extent.span()),
+                          curses.A_BOLD)
+            if not self.entry:
+                self.render_container(stdscr)
+            else:
+                self.render_entry(stdscr)
+
+        self.rendered_selection = self.selection
+        self.rendered_top_row_index = self.top_row_index
 
     def render_container(self, stdscr):
+        if not self.level_container_names and not self.level_entry_names:
+            # Nothing to select; draw the placeholder and blank the other rows
+            # directly rather than through the per-row logic.
+            stdscr.addstr(self.row_extent.min, self.col_extent.min,
+                          "<<<<NO ENTRIES>>>>".ljust(self.col_extent.span()))
+            blank_text = "".ljust(self.col_extent.span())
+            for scr_row in range(self.row_extent.min + 1, self.row_extent.max + 1):
+                stdscr.addstr(scr_row, self.col_extent.min, blank_text)
+            return
+
+        for r in range(self.top_row_index, self.top_row_index + self.row_extent.span()):
+            self.render_container_row(stdscr, r)
+
+    def render_container_row(self, stdscr, r):
         cc = len(self.level_container_names)
         ec = len(self.level_entry_names)
-        for r in range(self.top_row_index, self.top_row_index + self.row_extent.span()):
-            scr_row = self.row_extent.min + r - self.top_row_index
-            scr_col = self.col_extent.min
-            entry_text = ""
-            if r < cc:
-                entry_text = ">" + self.level_container_names[r]
-            elif r < cc + ec + 1 and r - cc < ec:
-                entry_text = self.level_entry_names[r-cc]
-            elif self.selection == 0 and cc + ec == 0 and r == self.top_row_index:
-                entry_text = "<<<<NO ENTRIES>>>>"
-
-            if self.selection == r and cc + ec > 0:
-                stdscr.addstr(scr_row, scr_col,
-                              entry_text.ljust(self.col_extent.span()),
-                              curses.A_REVERSE)
-            else:
-                stdscr.addstr(scr_row, scr_col,
-                              entry_text.ljust(self.col_extent.span()))
+        scr_row = self.row_extent.min + r - self.top_row_index
+        scr_col = self.col_extent.min
+        entry_text = ""
+        if r < cc:
+            entry_text = ">" + self.level_container_names[r]
+        elif r < cc + ec + 1 and r - cc < ec:
+            entry_text = self.level_entry_names[r-cc]
+
+        if self.selection == r and cc + ec > 0:
+            stdscr.addstr(scr_row, scr_col,
+                          entry_text.ljust(self.col_extent.span()),
+                          curses.A_REVERSE)
+        else:
+            stdscr.addstr(scr_row, scr_col,
+                          entry_text.ljust(self.col_extent.span()))
 
     def render_entry(self, stdscr):
-        cc = len(self.entry_actions)
         for r in range(self.top_row_index,
                        self.top_row_index + self.row_extent.span()):
-            scr_row = self.row_extent.min + r - self.top_row_index
-            scr_col = self.col_extent.min
-            entry_text = ""
-            text_attr = curses.color_pair(ColorPair.NORMAL)
-            if r < cc:
-                entry_text = self.entry_actions[r][0]
-                text_to_send = self.get_entry_action_text(r)
-                if not text_to_send or len(text_to_send) == 0:
-                    if self.selection == r:
-                        text_attr = curses.color_pair(ColorPair.NO_DATA_SELECTED)
-                    else:
-                        text_attr = curses.color_pair(ColorPair.NO_DATA)
-                    entry_text += " (no data to send!)"
-                elif self.selection == r:
-                    text_attr = curses.color_pair(ColorPair.SELECTED)
-
-                stdscr.addstr(scr_row, scr_col,
-                              entry_text.ljust(self.col_extent.span()),
-                              text_attr)
-            else:
-                stdscr.addstr(scr_row, scr_col,
-                              entry_text.ljust(self.col_extent.span()))
+            self.render_entry_row(stdscr, r)
+
+    def render_entry_row(self, stdscr, r):
+        cc = len(self.entry_actions)
+        scr_row = self.row_extent.min + r - self.top_row_index
+        scr_col = self.col_extent.min
+        entry_text = ""
+        text_attr = curses.color_pair(ColorPair.NORMAL)
+        if r < cc:
+            entry_text = self.entry_actions[r][0]
+            text_to_send = self.entry_action_texts[r]
+            if not text_to_send or len(text_to_send) == 0:
+                if self.selection == r:
+                    text_attr = curses.color_pair(ColorPair.NO_DATA_SELECTED)
+                else:
+                    text_attr = curses.color_pair(ColorPair.NO_DATA)
+                entry_text += " (no data to send!)"
+            elif self.selection == r:
+                text_attr = curses.color_pair(ColorPair.SELECTED)
+
+            stdscr.addstr(scr_row, scr_col,
+                          entry_text.ljust(self.col_extent.span()),
+                          text_attr)
+        else:
+            stdscr.addstr(scr_row, scr_col,
+                          entry_text.ljust(self.col_extent.span()))
 
 
-def render_instructions(stdscr, row, maxx):
+def write_row_text(stdscr, row, text, row_text_lens, attr=0):
+    """
+    Writes text from column 1 of a row, blanking only the trailing columns
+    still holding the longer text that was last written there.
+    :param row_text_lens: Per-row length of the text last written by this
+    function, updated for this row.
+    """
+    stdscr.addstr(row, 1, text, attr)
+    if len(text) < row_text_lens[row]:
+        stdscr.addstr(row, 1 + len(text),
+                      " " * (row_text_lens[row] - len(text)), attr)
+    row_text_lens[row] = len(text)
+
+
+def render_instructions(stdscr, row, maxx, row_text_lens, kbd_mode, store_present):
     text_attr = curses.color_pair(ColorPair.TITLE)
     text = ""
     addl_text_attr = curses.color_pair(ColorPair.NORMAL)
     addl_text = []
-    if shared_cfg.is_in_keyboard_mode():
+    if kbd_mode:
         text = "Keyboard Mode"
         if shared_cfg.master_store.is_empty():
             text += " (no data)"
@@ -281,7 +351,7 @@ def render_instructions(stdscr, row, maxx):
             addl_text.append("Navigate with wheel and")
             addl_text.append("{0} button".format(
                 HW_BTN_LABEL[ButtonAction.BACK]))
-    elif shared_cfg.master_store:
+    elif store_present:
         text = "Web Browser Management Mode"
         addl_text.append("Enable Keyboard mode from the")
         addl_text.append("web interface or go directly to")
@@ -293,7 +363,7 @@ def render_instructions(stdscr, row, maxx):
     stdscr.addstr(row, 1, text.center(maxx-2), text_attr)
     row += 1
     for r in range(0, len(addl_text)):
-        stdscr.addstr(row, 1, addl_text[r].ljust(maxx-2), addl_text_attr)
+        write_row_text(stdscr, row, addl_text[r], row_text_lens, addl_text_attr)
         row += 1
 
     return row
@@ -319,34 +389,59 @@ def cryptex(stdscr):
         raise Exception("Screen resolution of {0} x {1} characters "
                         "not supported. Sad.".format(maxx, maxy))
 
+    # State that was last rendered; used to only repaint what has changed.
+    last_store_present = None
+    last_kbd_mode = None
+    row = 1
+    # Column and text of each button label for this screen width
+    btn_labels = dict((button, (BTN_LABEL_X_POS[maxx][button-1], label))
+                      for button, label in HW_BTN_LABEL.items())
+    # What is on screen is unknown to begin with, so assume full-width rows
+    row_text_lens = [maxx - 2] * maxy
+    frame_dt = 1.0 / FRAMES_PER_SECOND
+    last_enc_activity = None
+
     try:
         while 1:
-            stdscr.border()
-
-            if shared_cfg.master_store:
-                stdscr.addstr(maxy - 1, BTN_LABEL_X_POS[maxx][ButtonAction.LOCK-1],
-                              HW_BTN_LABEL[ButtonAction.LOCK])
-
-            if shared_cfg.is_in_keyboard_mode():
-                stdscr.addstr(maxy - 1, BTN_LABEL_X_POS[maxx][ButtonAction.EDIT-1],
-                              HW_BTN_LABEL[ButtonAction.EDIT])
-                stdscr.addstr(maxy - 1, BTN_LABEL_X_POS[maxx][ButtonAction.BUTTON_3-1],
-                              HW_BTN_LABEL[ButtonAction.BUTTON_3])
-                stdscr.addstr(maxy - 1, BTN_LABEL_X_POS[maxx][ButtonAction.BACK-1],
-                              HW_BTN_LABEL[ButtonAction.BACK])
-
-            row = 1
-            row = render_instructions(stdscr, row, maxx)
+            loop_start = time.monotonic()
+            # Sample the shared state once, so the whole pass agrees on it
+            store_present = shared_cfg.master_store is not None
+            kbd_mode = shared_cfg.is_in_keyboard_mode()
+            dirty_store_flag = store_present != last_store_present
+            dirty_status = dirty_store_flag or kbd_mode != last_kbd_mode
+            dirty_selection = False
+            needs_refresh = dirty_status
+            last_store_present = store_present
+            last_kbd_mode = kbd_mode
+
+            if dirty_status:
+                stdscr.border()
+
+                if store_present:
+                    stdscr.addstr(maxy - 1, *btn_labels[ButtonAction.LOCK])
+
+                if kbd_mode:
+                    for button in KEYBOARD_MODE_BUTTONS:
+                        stdscr.addstr(maxy - 1, *btn_labels[button])
+
+                row = render_instructions(stdscr, 1, maxx, row_text_lens,
+                                          kbd_mode, store_present)
+                # The rows below are redrawn at full width by the navigator
+                # or the blanking below.
+                for r in range(row, maxy):
+                    row_text_lens[r] = maxx - 2
 
             new_enc_value, eb_pressed, hw_button = hardware.check_gpio(enc_value)
+            if new_enc_value != enc_value:
+                last_enc_activity = loop_start
 
-            if shared_cfg.master_store and hw_button == ButtonAction.LOCK:
+            if store_present and hw_button == ButtonAction.LOCK:
                 log.debug("Locking it down.")
                 shared_cfg.lock_store()
                 in_keyboard_mode = False
                 navigator = None
                 hardware.set_device_mode(shared_cfg.RNDIS_USB_MODE)
-            elif shared_cfg.is_in_keyboard_mode():
+            elif kbd_mode:
                 if hw_button == ButtonAction.EDIT:
                     log.debug("Going to web mode.")
                     shared_cfg.activate_web_mode()
@@ -372,18 +467,36 @@ def cryptex(stdscr):
                         in_keyboard_mode = True
                         navigator = StoreNavigator(1, row, maxx-2, maxy-3)
                         hardware.set_device_mode(shared_cfg.HID_USB_MODE)
-                    navigator.change_selection(round(direction))
-                    navigator.render_level(stdscr)
+                        dirty_selection = True
+                    prev_selection = navigator.selection
+                    if navigator.change_selection(round(direction)) != prev_selection:
+                        dirty_selection = True
                     if eb_pressed:
                         navigator.change_level(-1)
+                        dirty_selection = True
                     elif hw_button == 1:
                         navigator.change_level(1)
-            else: # Render all remaining rows empty
-                while row < maxy - 2:
-                    stdscr.addstr(row, 1, " ".ljust(maxx-2))
-                    row += 1
-
-            stdscr.refresh()
+                        dirty_selection = True
+                    if dirty_selection:
+                        navigator.render_level(stdscr)
+                        needs_refresh = True
+            elif dirty_status: # Render all remaining rows empty
+                blank_row = row
+                while blank_row < maxy - 2:
+                    stdscr.addstr(blank_row, 1, " ".ljust(maxx-2))
+                    blank_row += 1
+
+            if needs_refresh:
+                # Mark the window for update and flush to the terminal in one
+                # go, so any further windows would share a single write.
+                stdscr.noutrefresh()
+                curses.doupdate()
+
+            if (last_enc_activity is not None and
+                    loop_start - last_enc_activity < ENCODER_ACTIVE_SECONDS):
+                time.sleep(ENCODER_POLL_INTERVAL)
+            else:
+                time.sleep(max(0, frame_dt - (time.monotonic() - loop_start)))
     except KeyboardInterrupt:
         hardware.GPIO.cleanup()
 
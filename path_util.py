@@ -14,6 +14,18 @@ def simplify_path(path):
     return simple_path
 
 
+def split_path(path):
+    """Simplifies the given path, using simplify_path(), and splits it into the
+    path of its parent and its last segment. For example, given the path
+    /foo/bar/, this function will return ('/foo', 'bar'). Unlike
+    os.path.split(), the separator is always '/'."""
+    simp_path = simplify_path(path)
+    i = simp_path.rfind('/')
+    if i < 0:
+        return '/', simp_path
+    return simp_path[:i] or '/', simp_path[i+1:]
+
+
 def encode_path(path):
     """Converts a standard *nix/URL-style path to one which uses the '+'
     character for path separators. Before making this replacement, the path
@@ -5,7 +5,7 @@ import re
 import xml.etree.cElementTree as ET
 
 import encryption
-from path_util import simplify_path
+from path_util import simplify_path, split_path
 
 
 log = logging.getLogger(__name__)
@@ -13,6 +13,13 @@ log = logging.getLogger(__name__)
 ILLEGAL_NAME_CHARS = [u"'", u"\\\\", u"/"]
 ILLEGAL_CHAR_RE = re.compile("["+u"".join(ILLEGAL_NAME_CHARS)+"]")
 
+# Maximum number of paths PasswordStore remembers the container for
+CONTAINER_CACHE_SIZE = 256
+
+# Bumped whenever a container gains, loses or renames a child container, so
+# that cached path lookups can tell when they may be stale.
+_container_tree_version = 0
+
 
 class ECException(Exception):
     pass
@@ -34,10 +41,37 @@ class ECBadPathException(ECException):
     pass
 
 
+def _has_illegal_chars(name):
+    """Returns True if name contains any of ILLEGAL_NAME_CHARS."""
+    return ILLEGAL_CHAR_RE.search(name) is not None
+
+
+def _container_tree_changed():
+    global _container_tree_version
+
+    _container_tree_version += 1
+
+
+def _b64_encode_text(text):
+    """Returns the base64 encoding of the UTF-8 bytes of text, as a str."""
+    return b64encode(text.encode()).decode('utf-8')
+
+
 class EntryContainer:
+    __slots__ = ("containers", "entries", "_container_keys_b64",
+                 "_entry_keys_b64", "_sorted_container_names",
+                 "_sorted_entry_names")
+
     def __init__(self):
         self.containers = dict()
         self.entries = dict()
+        # Base64-encoded names, kept up to date so that saving does not have to
+        # re-encode every name each time.
+        self._container_keys_b64 = dict()
+        self._entry_keys_b64 = dict()
+        # Sorted name lists, built on demand and dropped on any change
+        self._sorted_container_names = None
+        self._sorted_entry_names = None
 
     def has_container(self, cont_name):
         return cont_name in self.containers
@@ -52,7 +86,20 @@ class EntryContainer:
         return len(self.containers)
 
     def get_containers(self):
-        return frozenset(self.containers.items())
+        """Returns a live view of the (name, object) pairs; take a copy
+        before modifying the container while iterating."""
+        return self.containers.items()
+
+    def get_sorted_container_names(self):
+        """Returns a sorted list of the names of the child containers. The list
+        is cached and shared, so callers must not modify it."""
+        if self._sorted_container_names is None:
+            self._sorted_container_names = sorted(self.containers)
+        return self._sorted_container_names
+
+    def get_container_name_b64(self, cont_name):
+        """Returns the base64 encoding of the name of a child container."""
+        return self._container_keys_b64[cont_name]
 
     def has_entry(self, entry_name):
         return entry_name in self.entries
@@ -67,20 +114,52 @@ class EntryContainer:
         return len(self.entries)
 
     def get_entries(self):
-        return frozenset(self.entries.items())
+        """Returns a live view of the (name, object) pairs; take a copy
+        before modifying the container while iterating."""
+        return self.entries.items()
+
+    def get_sorted_entry_names(self):
+        """Returns a sorted list of the names of the entries. The list is
+        cached and shared, so callers must not modify it."""
+        if self._sorted_entry_names is None:
+            self._sorted_entry_names = sorted(self.entries)
+        return self._sorted_entry_names
+
+    def get_entry_name_b64(self, entry_name):
+        """Returns the base64 encoding of the name of an entry."""
+        return self._entry_keys_b64[entry_name]
 
     def clear(self):
         self.containers.clear()
         self.entries.clear()
+        self._container_keys_b64.clear()
+        self._entry_keys_b64.clear()
+        self._sorted_container_names = None
+        self._sorted_entry_names = None
+        _container_tree_changed()
 
     def add_container(self, cont, name):
+        self._check_new_container_name(name)
+        self._insert_container(cont, name)
+
+    def _check_new_container_name(self, name):
         if name in self.containers:
             raise ECDuplicateException(
                 "Duplicate container name {0}".format(name))
-        if name and ILLEGAL_CHAR_RE.search(name):
+        if name and _has_illegal_chars(name):
             raise ECNaughtyCharacterException(
                 "Illegal character used in name {0}".format(name))
+
+    def _insert_container(self, cont, name, name_b64=None):
+        """Adds an already-validated container. name_b64 is the base64
+        encoding of name, if the caller already has it."""
         self.containers[name] = cont
+        if name:
+            if name_b64 is None:
+                name_b64 = _b64_encode_text(name)
+            self._container_keys_b64[name] = name_b64
+        self._sorted_container_names = None
+        _container_tree_changed()
 
     def rename_container(self, old_name, new_name):
         if old_name not in self.containers:
@@ -89,26 +168,42 @@ class EntryContainer:
         if new_name in self.containers:
             raise ECDuplicateException(
                 "Container with name '{0}' already present".format(new_name))
-        if ILLEGAL_CHAR_RE.search(new_name):
+        if _has_illegal_chars(new_name):
             raise ECNaughtyCharacterException(
                 "Illegal character used in new name {0}".format(new_name))
         cont = self.containers.pop(old_name)
-        self.add_container(cont, new_name)
+        self._container_keys_b64.pop(old_name, None)
+        self._insert_container(cont, new_name)
 
     def remove_container(self, name):
         if name not in self.containers:
             raise ECNotFoundException(
                 "Container with name '{}' not found".format(name))
         self.containers.pop(name)
+        self._container_keys_b64.pop(name, None)
+        self._sorted_container_names = None
+        _container_tree_changed()
 
     def add_entry(self, entry, name):
+        self._check_new_entry_name(name)
+        self._insert_entry(entry, name)
+
+    def _check_new_entry_name(self, name):
         if name in self.entries:
             raise ECDuplicateException(
                 "Entry with name {0} already exists".format(name))
-        if ILLEGAL_CHAR_RE.search(name):
+        if _has_illegal_chars(name):
             raise ECNaughtyCharacterException(
                 "Illegal character used in name {0}".format(name))
+
+    def _insert_entry(self, entry, name, name_b64=None):
+        """Adds an already-validated entry. As with _insert_container(),
+        name_b64 is the base64 encoding of name, if already known."""
         self.entries[name] = entry
+        if name_b64 is None:
+            name_b64 = _b64_encode_text(name)
+        self._entry_keys_b64[name] = name_b64
+        self._sorted_entry_names = None
 
     def replace_entry(self, entry, name):
         if name not in self.entries:
@@ -123,24 +218,53 @@ class EntryContainer:
         if new_name in self.entries:
             raise ECDuplicateException(
                 "Entry with name '{0}' already present".format(new_name))
-        if ILLEGAL_CHAR_RE.search(new_name):
+        if _has_illegal_chars(new_name):
             raise ECNaughtyCharacterException(
                 "Illegal character used in new name {0}".format(new_name))
         entry = self.entries.pop(old_name)
-        self.add_entry(entry, new_name)
+        self._entry_keys_b64.pop(old_name)
+        self._insert_entry(entry, new_name)
 
     def remove_entry(self, name):
         if name not in self.entries:
             raise ECNotFoundException(
                 "Entry with name '{}' not found".format(name))
         self.entries.pop(name)
+        self._entry_keys_b64.pop(name)
+        self._sorted_entry_names = None
 
 
 class Entry:
+    __slots__ = ("username", "password", "url",
+                 "_b64_username_src", "_b64_username",
+                 "_b64_password_src", "_b64_password",
+                 "_b64_url_src", "_b64_url")
+
+    # Maps field name to the slots holding the value that was last encoded
+    # and its base64 encoding
+    _B64_SLOTS = {
+        "username": ("_b64_username_src", "_b64_username"),
+        "password": ("_b64_password_src", "_b64_password"),
+        "url": ("_b64_url_src", "_b64_url")
+    }
+
     def __init__(self,  username=None, password=None, url=None):
         self.username = username
         self.password = password
         self.url = url
+        self._b64_username_src = self._b64_username = None
+        self._b64_password_src = self._b64_password = None
+        self._b64_url_src = self._b64_url = None
+
+    def get_b64_field(self, field):
+        """Returns the base64 encoding of the named field (e.g. "password").
+        The encoding is reused for as long as the field keeps the same value."""
+        value = getattr(self, field)
+        src_slot, b64_slot = self._B64_SLOTS[field]
+        if value is not getattr(self, src_slot):
+            setattr(self, b64_slot, _b64_encode_text(value))
+            setattr(self, src_slot, value)
+        return getattr(self, b64_slot)
 
     def get_username(self):
         return self.username
@@ -179,6 +303,21 @@ USERNAME_TAG = u"username"
 PASSWORD_TAG = u"password"
 URL_TAG = u"url"
 
+# Maps each entry field tag to the Entry setter for that field
+_ENTRY_SETTERS = {
+    USERNAME_TAG: Entry.set_username,
+    PASSWORD_TAG: Entry.set_password,
+    URL_TAG: Entry.set_url
+}
+
+
+def _decode_name(xml_node):
+    """Returns the decoded name attribute of the given XML node, or None if it
+    does not have one."""
+    if NAME_ATTRIBUTE in xml_node.attrib:
+        return b64decode(xml_node.attrib[NAME_ATTRIBUTE]).decode('utf-8')
+    return None
+
 
 def deserialize_xml(xml_node=None):
     """Given an XML node which represents the root of a container, creates
@@ -191,23 +330,33 @@ def deserialize_xml(xml_node=None):
     if xml_node is None:
         return cont_name, cont
 
-    if NAME_ATTRIBUTE in xml_node.attrib:
-        cont_name = b64decode(xml_node.attrib[NAME_ATTRIBUTE]).decode('utf-8')
-
-    for el in list(xml_node):
-        if el.tag == CONTAINER_TAG:
-            n, c = deserialize_xml(el)
-            cont.add_container(c, n)
-        elif el.tag == ENTRY_TAG:
-            new_entry = Entry()
-            for en in el.iter():
-                if en.tag == USERNAME_TAG:
-                    new_entry.set_username(b64decode(en.text).decode('utf-8'))
-                elif en.tag == PASSWORD_TAG:
-                    new_entry.set_password(b64decode(en.text).decode('utf-8'))
-                elif en.tag == URL_TAG:
-                    new_entry.set_url(b64decode(en.text).decode('utf-8'))
-            cont.add_entry(new_entry, b64decode(el.attrib[NAME_ATTRIBUTE]).decode('utf-8'))
+    cont_name = _decode_name(xml_node)
+
+    # Walk the tree with an explicit stack so that deeply nested stores do not
+    # hit the recursion limit.
+    stack = [(xml_node, cont)]
+    while stack:
+        node, parent = stack.pop()
+        for el in node:
+            if el.tag == CONTAINER_TAG:
+                child = EntryContainer()
+                name = _decode_name(el)
+                parent._check_new_container_name(name)
+                # name was decoded from the attribute, so the attribute is
+                # its encoding and can be kept as is
+                parent._insert_container(child, name,
+                                         el.attrib.get(NAME_ATTRIBUTE))
+                stack.append((el, child))
+            elif el.tag == ENTRY_TAG:
+                new_entry = Entry()
+                for en in el:
+                    setter = _ENTRY_SETTERS.get(en.tag)
+                    if setter is not None:
+                        setter(new_entry, b64decode(en.text).decode('utf-8'))
+                name_b64 = el.attrib[NAME_ATTRIBUTE]
+                name = b64decode(name_b64).decode('utf-8')
+                parent._check_new_entry_name(name)
+                parent._insert_entry(new_entry, name, name_b64)
 
     return cont_name, cont
 
@@ -217,27 +366,39 @@ def serialize_xml(xml_root, cont_name, cont, cont_tag=CONTAINER_TAG):
     the name 'cont_name'."""
     root_element = ET.SubElement(xml_root, cont_tag)
     if cont_name:
-        root_element.set(NAME_ATTRIBUTE, b64encode(cont_name.encode()).decode('utf-8'))
-
-    for k, e in cont.get_entries():
-        entry_el = ET.SubElement(root_element, ENTRY_TAG)
-        entry_el.set(NAME_ATTRIBUTE, b64encode(k.encode()).decode('utf-8'))
-        if e.get_username():
-            username_el = ET.SubElement(entry_el, USERNAME_TAG)
-            username_el.text = b64encode(e.get_username().encode()).decode('utf-8')
-        if e.get_password():
-            password_el = ET.SubElement(entry_el, PASSWORD_TAG)
-            password_el.text = b64encode(e.get_password().encode()).decode('utf-8')
-        if e.get_url():
-            url_el = ET.SubElement(entry_el, URL_TAG)
-            url_el.text = b64encode(e.get_url().encode()).decode('utf-8')
-
-    for k, c in cont.get_containers():
-        serialize_xml(root_element, k, c)
+        root_element.set(NAME_ATTRIBUTE, _b64_encode_text(cont_name))
+
+    # Each container's element is created before it is pushed, so the output
+    # keeps the same element order as a depth-first recursive walk.
+    stack = [(root_element, cont)]
+    while stack:
+        element, cont = stack.pop()
+        for k, e in cont.get_entries():
+            entry_el = ET.SubElement(element, ENTRY_TAG)
+            entry_el.set(NAME_ATTRIBUTE, cont.get_entry_name_b64(k))
+            if e.get_username():
+                username_el = ET.SubElement(entry_el, USERNAME_TAG)
+                username_el.text = e.get_b64_field("username")
+            if e.get_password():
+                password_el = ET.SubElement(entry_el, PASSWORD_TAG)
+                password_el.text = e.get_b64_field("password")
+            if e.get_url():
+                url_el = ET.SubElement(entry_el, URL_TAG)
+                url_el.text = e.get_b64_field("url")
+
+        for k, c in cont.get_containers():
+            cont_el = ET.SubElement(element, CONTAINER_TAG)
+            if k:
+                cont_el.set(NAME_ATTRIBUTE, cont.get_container_name_b64(k))
+            stack.append((cont_el, c))
 
 
 class PasswordStore:
     def __init__(self, serialized_data):
+        # Maps path to its container; cleared when the container tree changes
+        self._container_cache = dict()
+        self._container_cache_version = None
+
         # Parse serialized (XML) store data
         if serialized_data:
             try:
@@ -260,26 +421,32 @@ class PasswordStore:
     def is_valid_path(self, path):
         """Returns true if the given path is valid (i.e., is a path to a
         container or entry in the store)."""
+        parts = [p for p in simplify_path(path).split("/") if p]
+        if not parts:
+            return True
         dest_cont = self.root
-        cont_chain = list(filter(None, simplify_path(path).split("/")))
-        cc_count = len(cont_chain)
-        for c in cont_chain:
-            cc_count -= 1
-            try:
-                if cc_count > 0:
-                    dest_cont = dest_cont.get_container(c)
-                else:
-                    if not dest_cont.has_container(c):
-                        if not dest_cont.has_entry(c):
-                            return False
-            except ECNotFoundException:
+        for c in parts[:-1]:
+            if not dest_cont.has_container(c):
                 return False
-            except ECException as ex:
-                log.warning("Unexpected exception: {0}".format(ex))
-                return False
-        return True
+            dest_cont = dest_cont.get_container(c)
+        return dest_cont.has_container(parts[-1]) or dest_cont.has_entry(parts[-1])
 
     def get_container_by_path(self, path):
+        """Returns the EntryContainer at the given path. Results are cached
+        until any container in any store gains, loses or renames a child
+        container."""
+        if self._container_cache_version != _container_tree_version:
+            self._container_cache.clear()
+            self._container_cache_version = _container_tree_version
+        dest_cont = self._container_cache.get(path)
+        if dest_cont is None:
+            dest_cont = self._resolve_container(path)
+            if len(self._container_cache) >= CONTAINER_CACHE_SIZE:
+                self._container_cache.clear()
+            self._container_cache[path] = dest_cont
+        return dest_cont
+
+    def _resolve_container(self, path):
         dest_cont = self.root
         cont_chain = simplify_path(path).split("/")
         for c in cont_chain:
@@ -292,7 +459,7 @@ class PasswordStore:
             raise ECException("Invalid entry")
         if not entry_name or len(entry_name) == 0:
             raise ECException("Invalid entry name")
-        dest_cont = self.get_container_by_path(simplify_path(path))
+        dest_cont = self.get_container_by_path(path)
         dest_cont.add_entry(entry, entry_name)
 
     def update_entry(self, path, updated_name, updated_entry):
@@ -300,23 +467,23 @@ class PasswordStore:
             raise ECException("Invalid entry")
         if not updated_name or len(updated_name) == 0:
             raise ECException("Invalid entry name")
-        cont_path, current_name = os.path.split(path)
-        cont = self.get_container_by_path(simplify_path(cont_path))
+        cont_path, current_name = split_path(path)
+        cont = self.get_container_by_path(cont_path)
         if updated_name != current_name:
             cont.rename_entry(current_name, updated_name)
         cont.replace_entry(updated_entry, updated_name)
 
     def get_entry_by_path(self, path):
-        cont_path, ent_name = os.path.split(simplify_path(path))
+        cont_path, ent_name = split_path(path)
         cont = self.get_container_by_path(cont_path)
         return ent_name, cont.get_entry(ent_name)
 
     def get_entry_count_by_path(self, path):
-        cont = self.get_container_by_path(simplify_path(path))
+        cont = self.get_container_by_path(path)
         return len(cont.get_entries())
 
     def get_entries_by_path(self, path):
-        cont = self.get_container_by_path(simplify_path(path))
+        cont = self.get_container_by_path(path)
         return cont.get_entries()
 
     def add_container(self, cont, cont_name, path):
@@ -324,15 +491,15 @@ class PasswordStore:
             raise ECException("Invalid container")
         if not cont_name or len(cont_name) == 0:
             raise ECException("Invalid container name")
-        dest_cont = self.get_container_by_path(simplify_path(path))
+        dest_cont = self.get_container_by_path(path)
         dest_cont.add_container(cont, cont_name)
 
     def get_container_count_by_path(self, path):
-        cont = self.get_container_by_path(simplify_path(path))
+        cont = self.get_container_by_path(path)
         return len(cont.get_containers())
 
     def get_containers_by_path(self, path):
-        cont = self.get_container_by_path(simplify_path(path))
+        cont = self.get_container_by_path(path)
         return cont.get_containers()
 
     def serialize_to_xml(self):
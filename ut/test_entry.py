@@ -36,4 +36,9 @@ class TestEntry(TestCase):
         self.cut.set_url(new_url)
         self.assertEqual(new_url, self.cut.get_url())
 
-
+    def test_get_b64_field(self):
+        self.assertEqual("UEA1NXdlcmQ=", self.cut.get_b64_field("password"))
+        self.cut.set_password(PASSWORD + "1")
+        self.assertEqual("UEA1NXdlcmQx", self.cut.get_b64_field("password"))
+        self.cut.password = PASSWORD
+        self.assertEqual("UEA1NXdlcmQ=", self.cut.get_b64_field("password"))
@@ -39,6 +39,23 @@ class TestEntryContainer(TestCase):
             self.assertEqual("Confidence", k)
             self.assertEqual(new_cont, c)
 
+    def test_get_sorted_container_names(self):
+        self.cut.add_container(EntryContainer(), "Queen")
+        self.cut.add_container(EntryContainer(), "Bowie")
+        self.assertEqual(["Bowie", "Queen"],
+                         self.cut.get_sorted_container_names())
+        self.cut.add_container(EntryContainer(), "Abba")
+        self.assertEqual(["Abba", "Bowie", "Queen"],
+                         self.cut.get_sorted_container_names())
+        self.cut.rename_container("Queen", "Cream")
+        self.assertEqual(["Abba", "Bowie", "Cream"],
+                         self.cut.get_sorted_container_names())
+        self.cut.remove_container("Abba")
+        self.assertEqual(["Bowie", "Cream"],
+                         self.cut.get_sorted_container_names())
+        self.cut.clear()
+        self.assertEqual([], self.cut.get_sorted_container_names())
+
     def test_rename_nonexistent_container(self):
         with self.assertRaises(ECNotFoundException):
             self.cut.rename_container("old", "new")
@@ -136,6 +153,17 @@ class TestEntryContainer(TestCase):
             self.assertEqual("Rogue One", k)
             self.assertEqual(new_entry, e)
 
+    def test_get_sorted_entry_names(self):
+        self.cut.add_entry(Entry(), "Rogue Two")
+        self.cut.add_entry(Entry(), "Rogue One")
+        self.assertEqual(["Rogue One", "Rogue Two"],
+                         self.cut.get_sorted_entry_names())
+        self.cut.rename_entry("Rogue Two", "A New Hope")
+        self.assertEqual(["A New Hope", "Rogue One"],
+                         self.cut.get_sorted_entry_names())
+        self.cut.remove_entry("Rogue One")
+        self.assertEqual(["A New Hope"], self.cut.get_sorted_entry_names())
+
     def test_rename_nonexistent_entry(self):
         with self.assertRaises(ECNotFoundException):
             self.cut.rename_entry("old", "new")
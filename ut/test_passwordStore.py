@@ -1,7 +1,11 @@
 import os
+import sys
 from unittest import TestCase
-from pw_store import (ECBadPathException, ECNotFoundException, Entry,
-                      EntryContainer, PasswordStore)
+import xml.etree.cElementTree as ET
+from pw_store import (CONTAINER_TAG, ECBadPathException, ECDuplicateException,
+                      ECNotFoundException, ENTRY_TAG, Entry, EntryContainer,
+                      NAME_ATTRIBUTE, PasswordStore, ROOT_TAG, STORE_ROOT_TAG,
+                      serialize_xml)
 
 
 class TestPasswordStore(TestCase):
@@ -27,6 +31,19 @@ class TestPasswordStore(TestCase):
         self.assertEqual(lvl2, self.cut.get_container_by_path(u"/lvl1/lvl2"))
         self.assertEqual(lvl3, self.cut.get_container_by_path(u"/lvl1/lvl2/lvl3"))
 
+    def test_get_container_by_path_after_change(self):
+        root = self.cut.get_root()
+        lvl1 = EntryContainer()
+        root.add_container(lvl1, u"lvl1")
+        self.assertEqual(lvl1, self.cut.get_container_by_path(u"/lvl1"))
+        root.rename_container(u"lvl1", u"renamed")
+        with self.assertRaises(ECNotFoundException):
+            self.cut.get_container_by_path(u"/lvl1")
+        self.assertEqual(lvl1, self.cut.get_container_by_path(u"/renamed"))
+        root.remove_container(u"renamed")
+        with self.assertRaises(ECNotFoundException):
+            self.cut.get_container_by_path(u"/renamed")
+
     def test_valid_path(self):
         root = self.cut.get_root()
         lvl1 = EntryContainer()
@@ -36,6 +53,11 @@ class TestPasswordStore(TestCase):
         self.assertTrue(self.cut.is_valid_path(u"/lvl1"))
         self.assertTrue(self.cut.is_valid_path(u"/lvl1/lvl2"))
         self.assertFalse(self.cut.is_valid_path(u"lvl2"))
+        self.assertFalse(self.cut.is_valid_path(u"/lvl2/lvl1"))
+        lvl2.add_entry(Entry(), u"Entry1")
+        self.assertTrue(self.cut.is_valid_path(u"/lvl1/lvl2/Entry1"))
+        self.assertFalse(self.cut.is_valid_path(u"/lvl1/Entry1"))
+        self.assertTrue(self.cut.is_valid_path(u"/"))
 
     def test_invalid_container_path(self):
         with self.assertRaises(ECNotFoundException):
@@ -76,6 +98,61 @@ class TestPasswordStore(TestCase):
 
         self.match_containers(self.cut.get_root(), store.get_root())
 
+    def test_roundtrip_xml_string_serialization(self):
+        serialized_xml = self.cut.serialize_to_xml().decode('utf-8')
+        store = PasswordStore(serialized_xml)
+
+        self.match_containers(self.cut.get_root(), store.get_root())
+
+    def test_load_ignores_unknown_elements(self):
+        store = PasswordStore(b'<cryptex><store><other><entry name="QQ=="/>'
+                              b'</other><entry name="Qg=="><extra/>'
+                              b'<url>dQ==</url></entry></store></cryptex>')
+        root = store.get_root()
+        self.assertEqual(0, root.get_container_count())
+        self.assertEqual(1, root.get_entry_count())
+        self.assertEqual(u"u", root.get_entry(u"B").get_url())
+
+    def test_load_keeps_encoded_names(self):
+        store = PasswordStore(b'<cryptex><store><container name="Rm9v">'
+                              b'<entry name="Qg=="/></container></store>'
+                              b'</cryptex>')
+        root = store.get_root()
+        self.assertEqual(u"Rm9v", root.get_container_name_b64(u"Foo"))
+        self.assertEqual(u"Qg==",
+                         root.get_container(u"Foo").get_entry_name_b64(u"B"))
+
+    def test_load_rejects_duplicate_names(self):
+        with self.assertRaises(ECDuplicateException):
+            PasswordStore(b'<cryptex><store><entry name="Qg=="/>'
+                          b'<entry name="Qg=="/></store></cryptex>')
+
+    def test_load_deeply_nested_xml(self):
+        depth = sys.getrecursionlimit() + 100
+        xml = (b'<cryptex><store>' + b'<container name="Rm9v">' * depth +
+               b'<entry name="Qg=="/>' + b'</container>' * depth +
+               b'</store></cryptex>')
+        cont = PasswordStore(xml).get_root()
+        for _ in range(depth):
+            cont = cont.get_container(u"Foo")
+        self.assertIsNotNone(cont.get_entry(u"B"))
+
+    def test_serialize_deeply_nested_xml(self):
+        depth = sys.getrecursionlimit() + 100
+        cont = root = EntryContainer()
+        for _ in range(depth):
+            child = EntryContainer()
+            cont.add_container(child, u"Foo")
+            cont = child
+        cont.add_entry(Entry(username=u"deep"), u"B")
+        xml_root = ET.Element(ROOT_TAG)
+        serialize_xml(xml_root, None, root, STORE_ROOT_TAG)
+        element = xml_root.find(STORE_ROOT_TAG)
+        for _ in range(depth):
+            element = element.find(CONTAINER_TAG)
+            self.assertEqual(u"Rm9v", element.get(NAME_ATTRIBUTE))
+        self.assertEqual(u"Qg==", element.find(ENTRY_TAG).get(NAME_ATTRIBUTE))
+
     def test_update_entry_same_name(self):
         old_entry = Entry()
         old_entry.url = u"old_url"
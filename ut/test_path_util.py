@@ -1,5 +1,5 @@
 from unittest import TestCase
-from path_util import decode_path, encode_path, simplify_path
+from path_util import decode_path, encode_path, simplify_path, split_path
 
 
 class TestPathUtil(TestCase):
@@ -13,6 +13,13 @@ class TestPathUtil(TestCase):
         self.assertEqual('/foo/bar', simplify_path(' // / / foo  / / bar / '))
         self.assertEqual('/foo bar/bas', simplify_path('/foo bar/bas'))
 
+    def test_split_path(self):
+        self.assertEqual(('/', ''), split_path('/'))
+        self.assertEqual(('/', 'foo'), split_path('/foo'))
+        self.assertEqual(('/foo', 'bar'), split_path('/foo/bar/'))
+        self.assertEqual(('/foo bar', 'bas'), split_path(' // foo bar / bas '))
+        self.assertEqual(('/', ''), split_path(''))
+
     def test_encode_path(self):
         self.assertEqual('+', encode_path('/'))
         self.assertEqual('+', encode_path('//'))